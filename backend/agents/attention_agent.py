@@ -3,9 +3,14 @@ from langchain.tools import Tool
 from langchain_openai import ChatOpenAI
 from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain.memory import ConversationBufferWindowMemory
-from typing import Dict, Any
+from langchain.schema import HumanMessage, LLMResult, SystemMessage
+from typing import Callable, Dict, Any, Optional, Tuple
 import json
-from datetime import datetime, timedelta
+import logging
+import time
+from collections import deque
+from contextlib import nullcontext
+from datetime import datetime, timedelta, timezone
 import sys
 import os
 
@@ -14,6 +19,25 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from models import SimplifiedAnalysisRequest, TherapeuticResponse, AttentionStatus
 from config import settings
+from pregeneration import take_pregenerated
+from logging_config import truncate
+
+logger = logging.getLogger(__name__)
+
+# Static prefix for every therapeutic message; keep it stable so it stays cacheable
+THERAPEUTIC_SYSTEM_PROMPT = (
+    "You are a gentle digital wellness coach. Given a user's situation as key=value pairs, "
+    "reply with only a 1-2 sentence message: empathetic, encouraging, never preachy, "
+    "with one specific time-management step. Under time pressure, acknowledge it calmly "
+    "and focus on prioritization and realistic planning."
+)
+
+# Rule-based messages used when a client is rate limited or out of LLM budget
+RULE_BASED_MESSAGES = {
+    "high:distracting": "You have about {hours_left} hours left and {work_hours} hours of work planned. Try closing this tab and starting on your top-priority task.",
+    "high": "Today is tight, with {work_hours} hours of work and {hours_left} hours left. Pick the one or two tasks that matter most and start there.",
+    "medium:distracting": "Enjoy the pause, then head back to your {tasks} remaining tasks while there is still comfortable time.",
+}
 
 
 class AttentionAnalysisAgent:
@@ -32,6 +56,14 @@ class AttentionAnalysisAgent:
             return_messages=True
         )
         
+        # Context manager wrapped around live LLM calls; main.py hooks in the pre-generation worker
+        self.live_llm_call = nullcontext
+        
+        # Token usage of therapeutic message calls across all sessions
+        self.token_usage = {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0}
+        # Per-call usage of the most recent calls (no session identifiers)
+        self.recent_calls = deque(maxlen=settings.USAGE_RECENT_CALLS)
+        
         self.tools = self._create_tools()
         self.agent_executor = self._create_agent()
     
@@ -70,7 +102,7 @@ class AttentionAnalysisAgent:
                     return "neutral"
                     
             except Exception as e:
-                return f"error_analyzing_content: {str(e)}"
+                return f"error_analyzing_content: {truncate(e)}"
         
         def calculate_time_pressure(time_data: str) -> str:
             """Calculate time pressure based on current time and daily tasks"""
@@ -138,24 +170,7 @@ class AttentionAnalysisAgent:
         
         def generate_therapeutic_message(context: str) -> str:
             """Generate a therapeutic message based on the situation"""
-            therapeutic_prompt = f"""
-            Based on the following context about a user's attention and work situation, 
-            generate a gentle, therapeutic message that helps them manage their time and attention effectively.
-            
-            Context: {context}
-            
-            Guidelines:
-            - Be empathetic and understanding
-            - Use positive, encouraging language
-            - Offer specific, actionable time management suggestions
-            - Keep it concise (1-2 sentences)
-            - Avoid being preachy or condescending
-            - If there's time pressure, acknowledge it but provide calming guidance
-            - Focus on prioritization and realistic planning
-            """
-            
-            response = self.llm.invoke(therapeutic_prompt)
-            return response.content
+            return self.generate_therapeutic_message(None, context)
         
         return [
             Tool(
@@ -175,6 +190,110 @@ class AttentionAnalysisAgent:
             )
         ]
     
+    def _therapeutic_prompt(self, context: str) -> list:
+        """Build the messages for a therapeutic message
+        
+        The system message is identical on every call so servers that reuse
+        prompt prefixes can cache it; only the short context varies.
+        """
+        return [SystemMessage(content=THERAPEUTIC_SYSTEM_PROMPT), HumanMessage(content=context)]
+    
+    @staticmethod
+    def _max_tokens_for(key: Optional[str]) -> int:
+        """Output token cap for a message type"""
+        level = key.split(":")[0] if key else None
+        return settings.MESSAGE_MAX_TOKENS.get(level, settings.MESSAGE_MAX_TOKENS["default"])
+    
+    def _record_usage(self, key: Optional[str], result: LLMResult, session: Optional[Dict[str, Any]]) -> None:
+        """Add the token usage of one LLM call to the global and per-session totals"""
+        token_usage = (result.llm_output or {}).get("token_usage") or {}
+        usage = {
+            "calls": 1,
+            "prompt_tokens": token_usage.get("prompt_tokens", 0),
+            "completion_tokens": token_usage.get("completion_tokens", 0),
+        }
+        targets = [self.token_usage]
+        if session is not None:
+            targets.append(session.setdefault("token_usage", {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0}))
+        for totals in targets:
+            for field, value in usage.items():
+                totals[field] += value
+        self.recent_calls.append({
+            "message_key": key,
+            "prompt_tokens": usage["prompt_tokens"],
+            "completion_tokens": usage["completion_tokens"],
+            "timestamp": datetime.now(timezone.utc),
+        })
+        # One line per LLM call is low volume, so it is not sampled
+        logger.info("Therapeutic message tokens", extra={"message_key": key, **usage})
+    
+    def generate_therapeutic_message(self, key: Optional[str], context: str, session: Optional[Dict[str, Any]] = None) -> str:
+        """Generate a therapeutic message, capped by message type"""
+        result = self.llm.generate([self._therapeutic_prompt(context)], max_tokens=self._max_tokens_for(key))
+        self._record_usage(key, result, session)
+        return result.generations[0][0].text.strip()
+    
+    async def agenerate_therapeutic_message(self, key: Optional[str], context: str, session: Optional[Dict[str, Any]] = None) -> str:
+        """Generate a therapeutic message without blocking the event loop"""
+        result = await self.llm.agenerate([self._therapeutic_prompt(context)], max_tokens=self._max_tokens_for(key))
+        self._record_usage(key, result, session)
+        return result.generations[0][0].text.strip()
+    
+    @staticmethod
+    def _compact_context(**fields) -> str:
+        """Render message context as compact key=value pairs"""
+        return "; ".join(f"{name}={value}" for name, value in fields.items())
+    
+    def build_message_context(self, dom_analysis: Optional[str], time_pressure_data: Dict[str, Any]) -> Optional[Tuple[str, str]]:
+        """Return (message_key, context) for the intervention this situation calls for, or None"""
+        pressure_level = time_pressure_data.get("time_pressure_level", "low")
+        pressure_ratio = time_pressure_data.get("pressure_ratio", 0)
+        
+        if pressure_level == "high" or pressure_ratio > 1.2:
+            key = "high:distracting" if dom_analysis == "distracting" else "high"
+            context = self._compact_context(
+                pressure="high",
+                site=dom_analysis or "unknown",
+                hours_left=time_pressure_data.get("hours_remaining", 0),
+                work_hours=time_pressure_data.get("total_task_hours", 0),
+                ratio=pressure_ratio,
+            )
+            return key, context
+        
+        if pressure_level == "medium" and dom_analysis == "distracting":
+            context = self._compact_context(
+                pressure="medium",
+                site="distracting",
+                tasks=time_pressure_data.get("task_count", 0),
+            )
+            return "medium:distracting", context
+        
+        return None
+    
+    @staticmethod
+    def _rule_based_message(key: str, time_pressure_data: Dict[str, Any]) -> str:
+        """Fill the rule-based template for a message type"""
+        return RULE_BASED_MESSAGES[key].format(
+            hours_left=time_pressure_data.get("hours_remaining", 0),
+            work_hours=time_pressure_data.get("total_task_hours", 0),
+            tasks=time_pressure_data.get("task_count", 0),
+        )
+    
+    async def _resolve_message(self, key: str, context: str, time_pressure_data: Dict[str, Any], session: Optional[Dict[str, Any]], llm_budget: Optional[Callable[[], bool]]) -> str:
+        """Use a pre-generated message for this session when available, otherwise call the LLM
+        
+        llm_budget is asked right before a live LLM call; when it returns False
+        the rule-based message is used instead. Only this live call runs inside
+        live_llm_call, so requests that never reach the LLM leave pre-generation alone.
+        """
+        message = take_pregenerated(session, key, time_pressure_data.get("total_task_hours"))
+        if message is not None:
+            return message
+        if llm_budget is not None and not llm_budget():
+            return self._rule_based_message(key, time_pressure_data)
+        async with self.live_llm_call():
+            return await self.agenerate_therapeutic_message(key, context, session)
+    
     def _create_agent(self) -> AgentExecutor:
         """Create the LangChain agent executor"""
         prompt = ChatPromptTemplate.from_messages([
@@ -205,10 +324,15 @@ class AttentionAnalysisAgent:
         ])
         
         agent = create_openai_tools_agent(self.llm, self.tools, prompt)
-        return AgentExecutor(agent=agent, tools=self.tools, memory=self.memory, verbose=True)
+        return AgentExecutor(agent=agent, tools=self.tools, memory=self.memory, verbose=False)
     
-    async def analyze_attention(self, request: SimplifiedAnalysisRequest) -> TherapeuticResponse:
-        """Main method to analyze user attention and time pressure"""
+    async def analyze_attention(self, request: SimplifiedAnalysisRequest, session: Optional[Dict[str, Any]] = None, llm_budget: Optional[Callable[[], bool]] = None) -> TherapeuticResponse:
+        """Main method to analyze user attention and time pressure
+        
+        When a session dict is given, the latest observation is recorded on it
+        and pre-generated interventions stored there are used in place of a live LLM call.
+        When llm_budget is given, it gates every live LLM call (see _resolve_message).
+        """
         
         try:
             # Analyze DOM content
@@ -227,6 +351,11 @@ class AttentionAnalysisAgent:
             except:
                 time_pressure_data = {"time_pressure_level": "low", "pressure_ratio": 0}
             
+            if session is not None:
+                session["dom_analysis"] = dom_analysis
+                session["time_pressure"] = time_pressure_data
+                session["observed_at"] = time.monotonic()
+            
             # Default response
             therapeutic_response = TherapeuticResponse(
                 action_needed=False,
@@ -240,6 +369,7 @@ class AttentionAnalysisAgent:
             # Determine attention status and need for intervention
             pressure_level = time_pressure_data.get("time_pressure_level", "low")
             pressure_ratio = time_pressure_data.get("pressure_ratio", 0)
+            message_context = self.build_message_context(dom_analysis, time_pressure_data)
             
             # High time pressure scenarios
             if pressure_level == "high" or pressure_ratio > 1.2:
@@ -248,12 +378,9 @@ class AttentionAnalysisAgent:
                 therapeutic_response.severity_level = min(10, int(pressure_ratio * 5))
                 
                 if dom_analysis == "distracting":
-                    context_for_message = f"User is on a distracting site but has {time_pressure_data.get('hours_remaining', 0)} hours remaining with {time_pressure_data.get('total_task_hours', 0)} hours of work. Pressure ratio: {pressure_ratio}"
                     therapeutic_response.severity_level = min(10, therapeutic_response.severity_level + 2)
-                else:
-                    context_for_message = f"User has time pressure with {time_pressure_data.get('hours_remaining', 0)} hours remaining and {time_pressure_data.get('total_task_hours', 0)} hours of work needed"
                 
-                therapeutic_response.message = self.tools[2].func(context_for_message)
+                therapeutic_response.message = await self._resolve_message(*message_context, time_pressure_data, session, llm_budget)
                 therapeutic_response.recommendations = [
                     "Review and prioritize your most important tasks",
                     "Consider breaking large tasks into smaller, manageable chunks",
@@ -267,8 +394,7 @@ class AttentionAnalysisAgent:
                 therapeutic_response.attention_status = AttentionStatus.BRIEFLY_DISTRACTED
                 therapeutic_response.severity_level = 4
                 
-                context_for_message = f"User is taking a break but has moderate time pressure with {time_pressure_data.get('task_count', 0)} tasks remaining"
-                therapeutic_response.message = self.tools[2].func(context_for_message)
+                therapeutic_response.message = await self._resolve_message(*message_context, time_pressure_data, session, llm_budget)
                 therapeutic_response.recommendations = [
                     "Consider returning to your priority tasks",
                     "Take breaks mindfully to maintain energy"
@@ -285,11 +411,12 @@ class AttentionAnalysisAgent:
             return therapeutic_response
             
         except Exception as e:
+            logger.warning("Attention analysis failed", exc_info=True)
             # Fallback response
             return TherapeuticResponse(
                 action_needed=False,
                 attention_status=AttentionStatus.FOCUSED,
                 severity_level=1,
-                message=f"Unable to analyze attention pattern: {str(e)}",
+                message=f"Unable to analyze attention pattern: {truncate(e)}",
                 recommendations=[]
             ) 
\ No newline at end of file
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Benchmark the per-line cost of logging in the /analyze handler.
+
+Both setups log the same two INFO lines per request with the same values:
+"before" is the previous basicConfig handler with eager f-strings, "after" is
+the queue-based JSON pipeline from logging_config. The time spent in the
+calling thread is what a request pays; the "total" column also waits for the
+listener to drain the queue, i.e. the full CPU cost of the pipeline. Each setup
+runs against a fast sink (a temp file) and a slow one that blocks like a
+back-pressured stdout pipe.
+"""
+
+import logging
+import sys
+import tempfile
+import time
+
+from config import settings
+from logging_config import log_routine, setup_logging
+
+REQUESTS = 10000
+LINES_PER_REQUEST = 2
+SLOW_SINK_DELAY_SECONDS = 0.0001
+
+SUMMARY = "Time pressure: high - Status: time_pressure - Intervention provided (severity: 8/10)"
+
+# Module defaults that setup_logging switches off
+_LOGGING_DEFAULTS = {name: getattr(logging, name) for name in ("_srcfile", "logThreads", "logProcesses", "logMultiprocessing")}
+
+
+class SlowSink:
+    """File-like sink whose writes block, releasing the GIL, like a full pipe"""
+
+    def __init__(self, sink):
+        self.sink = sink
+
+    def write(self, text):
+        time.sleep(SLOW_SINK_DELAY_SECONDS)
+        return self.sink.write(text)
+
+    def flush(self):
+        self.sink.flush()
+
+
+def log_request_before(logger: logging.Logger):
+    logger.info(f"Analyzing attention with simplified schema: dom_chars={100000}")
+    logger.info(f"Analysis complete: {SUMMARY} next_check_in={120}")
+
+
+def log_request_after(logger: logging.Logger):
+    log_routine(logger, logging.INFO, "Analyzing attention with simplified schema", dom_chars=100000)
+    log_routine(logger, logging.INFO, "Analysis complete", summary=SUMMARY, next_check_in=120)
+
+
+def run(label: str, log_request, logger: logging.Logger, listener=None):
+    start = time.perf_counter()
+    for _ in range(REQUESTS):
+        log_request(logger)
+    calling = time.perf_counter() - start
+    if listener is not None:
+        listener.stop()  # waits for the queue to drain
+    total = time.perf_counter() - start
+
+    lines = REQUESTS * LINES_PER_REQUEST
+    print(
+        f"  {label:<34} calling thread {calling / lines * 1e6:7.2f} us/line   total {total / lines * 1e6:7.2f} us/line",
+        file=sys.__stdout__,
+    )
+
+
+def main():
+    logger = logging.getLogger("benchmark")
+    root = logging.getLogger()
+    settings.LOG_LEVEL = "INFO"
+    configured_rate = settings.LOG_SAMPLE_RATE
+
+    with tempfile.TemporaryFile("w") as file_sink:
+        for sink_label, sink in (("fast sink (file)", file_sink), ("slow sink (blocking writes)", SlowSink(file_sink))):
+            print(sink_label, file=sys.__stdout__)
+
+            # Before: synchronous stream handler, formatted in the request thread
+            for name, value in _LOGGING_DEFAULTS.items():
+                setattr(logging, name, value)
+            root.handlers[:] = []
+            logging.basicConfig(level=logging.INFO, stream=sink, force=True)
+            run("before (basicConfig, f-strings)", log_request_before, logger)
+
+            # After: queue handler with JSON lines, unsampled and at the configured rate
+            sys.stdout = sink
+            for rate in sorted({1.0, configured_rate}, reverse=True):
+                settings.LOG_SAMPLE_RATE = rate
+                listener = setup_logging()
+                run(f"after (queue + JSON, sample {rate})", log_request_after, logger, listener)
+            sys.stdout = sys.__stdout__
+            settings.LOG_SAMPLE_RATE = configured_rate
+
+
+if __name__ == "__main__":
+    main()
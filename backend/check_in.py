@@ -0,0 +1,71 @@
+"""
+Adaptive per-session polling cadence.
+
+The check-in interval starts from the attention status. Only sessions that are
+focused and whose verdicts have been stable (an EWMA of status and pressure
+changes) are stretched, further so when the server is busy. Sessions that need
+an intervention or are not focused never wait longer than their status base
+interval, and shrink towards half of it while volatile. No session is told to
+wait past its next forecast time-pressure threshold crossing. The result is
+jittered so clients spread out, and clamped to the configured bounds.
+"""
+
+import random
+from typing import Any, Dict
+
+from config import settings
+from pregeneration import PRESSURE_THRESHOLDS, forecast_crossings
+
+# Interval before adjustments, by attention status
+BASE_CHECK_IN_SECONDS = {
+    "time_pressure": 30,
+    "focused": 120,
+}
+DEFAULT_CHECK_IN_SECONDS = 60
+
+# A pressure ratio change of one threshold gap counts as a full verdict change
+_RATIO_CHANGE_SCALE = PRESSURE_THRESHOLDS[1][1] - PRESSURE_THRESHOLDS[0][1]
+
+
+def _update_volatility(session: Dict[str, Any], status: str, pressure_ratio: float) -> float:
+    """Fold the latest verdict into the session's EWMA of verdict changes"""
+    if "volatility" not in session:
+        volatility = 0.5  # no history yet
+    else:
+        status_change = 1.0 if status != session["last_status"] else 0.0
+        ratio_change = min(1.0, abs(pressure_ratio - session["last_pressure_ratio"]) / _RATIO_CHANGE_SCALE)
+        change = max(status_change, ratio_change)
+        alpha = settings.CHECK_IN_EWMA_ALPHA
+        volatility = alpha * change + (1 - alpha) * session["volatility"]
+
+    session["volatility"] = volatility
+    session["last_status"] = status
+    session["last_pressure_ratio"] = pressure_ratio
+    return volatility
+
+
+def next_check_in_seconds(session: Dict[str, Any], status: str, action_needed: bool, concurrent_requests: int, now: float) -> int:
+    """Compute the next check-in interval for a session and record its latest verdict"""
+    pressure_ratio = (session.get("time_pressure") or {}).get("pressure_ratio") or 0
+    volatility = _update_volatility(session, status, pressure_ratio)
+
+    base = BASE_CHECK_IN_SECONDS.get(status, DEFAULT_CHECK_IN_SECONDS)
+    stable = not action_needed and status == "focused" and volatility < 0.5
+
+    if stable:
+        # From the base at volatility 0.5 up to CHECK_IN_STABLE_STRETCH times it at 0
+        interval = base * (1 + (1 - 2 * volatility) * (settings.CHECK_IN_STABLE_STRETCH - 1))
+        # Back off under load, up to doubling at CHECK_IN_LOAD_REFERENCE concurrent requests
+        interval *= 1 + min(1.0, concurrent_requests / settings.CHECK_IN_LOAD_REFERENCE)
+        interval *= 1 + random.uniform(-settings.CHECK_IN_JITTER, settings.CHECK_IN_JITTER)
+    else:
+        # Never later than the base, down to half of it while volatile; jitter
+        # only downwards so the cap does not pin steady clients to the same second
+        interval = base * (1 - 0.5 * volatility) * (1 - random.uniform(0, settings.CHECK_IN_JITTER))
+
+    # Never sleep through the next threshold crossing
+    crossings = forecast_crossings(session, now, settings.CHECK_IN_MAX_SECONDS)
+    if crossings:
+        interval = min(interval, min(eta for eta, _ in crossings))
+
+    return int(min(settings.CHECK_IN_MAX_SECONDS, max(settings.CHECK_IN_MIN_SECONDS, interval)))
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -19,10 +20,56 @@ class Settings:
     TOP_P: float = 0.7
     MAX_TOKENS: int = 1024
     
+    # Output token caps for therapeutic messages, by pressure level (1-2 sentences)
+    MESSAGE_MAX_TOKENS: dict = {
+        "high": int(os.getenv("MESSAGE_MAX_TOKENS_HIGH", "96")),
+        "medium": int(os.getenv("MESSAGE_MAX_TOKENS_MEDIUM", "64")),
+        "default": int(os.getenv("MESSAGE_MAX_TOKENS_DEFAULT", "80")),
+    }
+    
+    # Token Accounting
+    USAGE_RECENT_CALLS: int = int(os.getenv("USAGE_RECENT_CALLS", "100"))  # per-call entries kept for GET /usage
+    
     # Application Settings
     LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
+    LOG_SAMPLE_RATE: float = float(os.getenv("LOG_SAMPLE_RATE", "0.1"))  # share of routine per-request lines kept
+    LOG_MAX_FIELD_CHARS: int = int(os.getenv("LOG_MAX_FIELD_CHARS", "256"))
+    LOG_MAX_MESSAGE_CHARS: int = int(os.getenv("LOG_MAX_MESSAGE_CHARS", "1024"))
+    LOG_TRACEBACK_FRAMES: int = int(os.getenv("LOG_TRACEBACK_FRAMES", "10"))  # innermost frames kept on error lines
     HOST: str = os.getenv("HOST", "0.0.0.0")
     PORT: int = int(os.getenv("PORT", "8000"))
+    
+    # Session Tracking
+    SESSION_TTL_SECONDS: int = int(os.getenv("SESSION_TTL_SECONDS", "1800"))  # 30 minutes
+    SESSION_CLEANUP_INTERVAL_SECONDS: int = int(os.getenv("SESSION_CLEANUP_INTERVAL_SECONDS", "60"))
+    
+    # Rate Limiting (state shared by all workers through a local SQLite file)
+    RATE_LIMIT_ENABLED: bool = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+    RATE_LIMIT_DB_PATH: str = os.getenv("RATE_LIMIT_DB_PATH", os.path.join(tempfile.gettempdir(), "attention_monitor_limits.sqlite3"))
+    RATE_LIMIT_CLIENT_CAPACITY: int = int(os.getenv("RATE_LIMIT_CLIENT_CAPACITY", "10"))
+    RATE_LIMIT_CLIENT_PER_MINUTE: float = float(os.getenv("RATE_LIMIT_CLIENT_PER_MINUTE", "4"))
+    RATE_LIMIT_IP_CAPACITY: int = int(os.getenv("RATE_LIMIT_IP_CAPACITY", "30"))
+    RATE_LIMIT_IP_PER_MINUTE: float = float(os.getenv("RATE_LIMIT_IP_PER_MINUTE", "20"))
+    LLM_DAILY_BUDGET: int = int(os.getenv("LLM_DAILY_BUDGET", "200"))  # LLM-backed responses per user per day
+    LLM_DAILY_BUDGET_PER_IP: int = int(os.getenv("LLM_DAILY_BUDGET_PER_IP", "1000"))  # bounds clients rotating their id
+    RATE_LIMIT_DB_TIMEOUT_MS: int = int(os.getenv("RATE_LIMIT_DB_TIMEOUT_MS", "50"))  # wait for the write lock, then fail open
+    RATE_LIMIT_PRUNE_INTERVAL_SECONDS: int = int(os.getenv("RATE_LIMIT_PRUNE_INTERVAL_SECONDS", "300"))
+    
+    # Adaptive Check-in Cadence
+    CHECK_IN_MIN_SECONDS: int = int(os.getenv("CHECK_IN_MIN_SECONDS", "20"))
+    CHECK_IN_MAX_SECONDS: int = int(os.getenv("CHECK_IN_MAX_SECONDS", "300"))
+    CHECK_IN_EWMA_ALPHA: float = float(os.getenv("CHECK_IN_EWMA_ALPHA", "0.3"))  # weight of the latest verdict change
+    CHECK_IN_STABLE_STRETCH: float = float(os.getenv("CHECK_IN_STABLE_STRETCH", "2.5"))  # multiplier for fully stable sessions
+    CHECK_IN_LOAD_REFERENCE: int = int(os.getenv("CHECK_IN_LOAD_REFERENCE", "50"))  # concurrent requests that double the interval
+    CHECK_IN_JITTER: float = float(os.getenv("CHECK_IN_JITTER", "0.1"))  # +/- fraction
+    
+    # Speculative Intervention Pre-generation
+    PREGENERATION_ENABLED: bool = os.getenv("PREGENERATION_ENABLED", "true").lower() == "true"
+    PREGENERATION_HORIZON_SECONDS: int = int(os.getenv("PREGENERATION_HORIZON_SECONDS", "600"))  # forecast 10 minutes ahead
+    PREGENERATION_INTERVAL_SECONDS: int = int(os.getenv("PREGENERATION_INTERVAL_SECONDS", "15"))
+    PREGENERATION_IDLE_GRACE_SECONDS: float = float(os.getenv("PREGENERATION_IDLE_GRACE_SECONDS", "2"))
+    PREGENERATION_ACTIVE_SECONDS: int = int(os.getenv("PREGENERATION_ACTIVE_SECONDS", str(CHECK_IN_MAX_SECONDS + 60)))  # only sessions seen this recently
+    PREGENERATION_TTL_SECONDS: int = int(os.getenv("PREGENERATION_TTL_SECONDS", "900"))  # keep 15 minutes past the crossing
 
 
 settings = Settings() 
\ No newline at end of file
@@ -0,0 +1,112 @@
+"""
+Low-overhead structured logging.
+
+Request handlers build a log record and enqueue it; a QueueListener thread
+formats it as a JSON line and writes it to stdout, so a slow stdout never blocks
+a request. The listener still shares the GIL with request handlers, so its
+formatting competes for CPU; the savings come from cheap record creation and
+from dropping sampled-out routine lines before a record is built. Every field
+is truncated so large payloads (such as the DOM or exceptions that embed it)
+never end up in the log in full.
+"""
+
+import json
+import logging
+import queue
+import random
+import sys
+import traceback
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any
+
+from config import settings
+
+# Attributes every LogRecord has; anything else was passed through `extra`
+_RESERVED_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+
+def truncate(value: Any, limit: int = None) -> str:
+    """Stringify a value and cut it down to the configured field size"""
+    limit = limit or settings.LOG_MAX_FIELD_CHARS
+    text = value if isinstance(value, str) else str(value)
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}...(+{len(text) - limit} chars)"
+
+
+def log_routine(logger: logging.Logger, level: int, msg: str, **fields) -> None:
+    """Log a routine per-request line with structured fields, sampled at LOG_SAMPLE_RATE
+
+    Sampling happens before the record is created, so dropped lines cost almost nothing.
+    """
+    if logger.isEnabledFor(level) and random.random() < settings.LOG_SAMPLE_RATE:
+        logger.log(level, msg, extra=fields)
+
+
+class JsonFormatter(logging.Formatter):
+    """Render a record as a single JSON line"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": truncate(record.getMessage(), settings.LOG_MAX_MESSAGE_CHARS),
+        }
+        for name, value in vars(record).items():
+            if name not in _RESERVED_ATTRS:
+                entry[name] = value if isinstance(value, (int, float, bool)) or value is None else truncate(value)
+        if record.exc_info and record.exc_info[1] is not None:
+            entry["exc_type"] = record.exc_info[0].__name__
+            entry["exc"] = truncate(record.exc_info[1])
+            # Innermost frames are the useful ones, so keep the tail of the traceback
+            frames = traceback.format_tb(record.exc_info[2], limit=-settings.LOG_TRACEBACK_FRAMES)
+            entry["traceback"] = truncate("".join(frames), settings.LOG_MAX_MESSAGE_CHARS)
+        return json.dumps(entry, default=str)
+
+
+class DeferredQueueHandler(QueueHandler):
+    """QueueHandler that leaves formatting to the listener thread
+
+    The stock handler formats the message in the calling thread before
+    enqueueing; records here stay in-process, so that work can be deferred.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def setup_logging() -> QueueListener:
+    """Route the root logger through a non-blocking queue; returns the started listener"""
+    # The JSON lines carry none of the caller, thread or process details,
+    # so skip collecting them for every record (see the logging HOWTO, "Optimization")
+    logging._srcfile = None
+    logging.logThreads = False
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = DeferredQueueHandler(log_queue)
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(JsonFormatter())
+
+    root = logging.getLogger()
+    root.handlers[:] = [queue_handler]
+    root.setLevel(getattr(logging, settings.LOG_LEVEL))
+
+    # uvicorn installs its own synchronous stdout handlers; send its lines
+    # through the queue instead, and drop its per-request access line in
+    # favour of the sampled one logged by the app's middleware
+    for name in ("uvicorn", "uvicorn.error"):
+        uvicorn_logger = logging.getLogger(name)
+        uvicorn_logger.handlers[:] = []
+        uvicorn_logger.propagate = True
+    access_logger = logging.getLogger("uvicorn.access")
+    access_logger.handlers[:] = []
+    access_logger.propagate = False
+
+    listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    listener.start()
+    return listener
@@ -1,18 +1,24 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Request
 from fastapi.middleware.cors import CORSMiddleware
 from datetime import datetime, timedelta
 import logging
 import asyncio
 import json
+import time
 from typing import Dict
 
 from models import SimplifiedAnalysisRequest, AnalysisResponse, TherapeuticResponse
 from agents.attention_agent import AttentionAnalysisAgent
 from config import settings
+from logging_config import log_routine, setup_logging, truncate
+from pregeneration import InterventionPregenerator
+from rate_limiter import RateLimiter
+from check_in import next_check_in_seconds
 
-# Configure logging
-logging.basicConfig(level=getattr(logging, settings.LOG_LEVEL))
+# Configure logging (JSON lines, written from a background thread)
+log_listener = setup_logging()
 logger = logging.getLogger(__name__)
+access_logger = logging.getLogger("access")
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -30,18 +36,79 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Requests currently being handled by this worker, used as the server-load signal
+in_flight_requests = 0
+
+
+@app.middleware("http")
+async def count_in_flight_requests(request: Request, call_next):
+    """Track how many requests this worker is handling at once and log a sampled access line"""
+    global in_flight_requests
+    in_flight_requests += 1
+    started = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        in_flight_requests -= 1
+        log_routine(
+            access_logger,
+            logging.INFO,
+            "request",
+            method=request.method,
+            path=request.url.path,
+            status=status_code,
+            duration_ms=round((time.perf_counter() - started) * 1000, 1),
+        )
+
+
 # Initialize the attention analysis agent
 attention_agent = AttentionAnalysisAgent()
 
 # In-memory session storage (use Redis/database in production)
 user_sessions: Dict[str, Dict] = {}
 
+# Per-client/IP request limits and daily LLM budgets, shared across workers
+rate_limiter = RateLimiter(settings.RATE_LIMIT_DB_PATH) if settings.RATE_LIMIT_ENABLED else None
+
+# Background worker that pre-generates interventions ahead of threshold crossings
+pregenerator = InterventionPregenerator(attention_agent, user_sessions, rate_limiter)
+# Live LLM calls pre-empt any pre-generation in flight
+attention_agent.live_llm_call = pregenerator.live_request
+pregeneration_task = None
+session_janitor_task = None
+
+
+async def evict_stale_sessions():
+    """Periodically forget sessions that have not been seen for SESSION_TTL_SECONDS"""
+    while True:
+        await asyncio.sleep(settings.SESSION_CLEANUP_INTERVAL_SECONDS)
+        cutoff = time.monotonic() - settings.SESSION_TTL_SECONDS
+        for session_id, session in list(user_sessions.items()):
+            if session.get("last_seen", 0) < cutoff:
+                del user_sessions[session_id]
+
 
 @app.on_event("startup")
 async def startup_event():
     """Initialize the application on startup"""
+    global pregeneration_task, session_janitor_task
     logger.info("Starting Virtual Assistant Attention Monitor API v2.0")
-    logger.info(f"Using model: {settings.MODEL_NAME}")
+    logger.info("Using model: %s", settings.MODEL_NAME)
+    session_janitor_task = asyncio.create_task(evict_stale_sessions())
+    if settings.PREGENERATION_ENABLED:
+        pregeneration_task = asyncio.create_task(pregenerator.run())
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop background workers on shutdown"""
+    for task in (pregeneration_task, session_janitor_task):
+        if task is not None:
+            task.cancel()
+    log_listener.stop()
 
 
 @app.get("/")
@@ -67,7 +134,7 @@ async def health_check():
 
 
 @app.post("/analyze", response_model=AnalysisResponse)
-async def analyze_attention_simplified(request: SimplifiedAnalysisRequest):
+async def analyze_attention_simplified(request: SimplifiedAnalysisRequest, http_request: Request, background_tasks: BackgroundTasks):
     """
     Simplified endpoint for analyzing user attention based on DOM, current time, and tasks
     
@@ -86,11 +153,12 @@ async def analyze_attention_simplified(request: SimplifiedAnalysisRequest):
                 "estimated_duration_minutes": 45,
                 "priority": "medium"
             }
-        }
+        },
+        "session_id": "optional stable client identifier"
     }
     """
     try:
-        logger.info("Analyzing attention with simplified schema")
+        log_routine(logger, logging.DEBUG, "Analyzing attention with simplified schema", dom_chars=len(request.dom))
         
         # Parse current time to extract user context
         try:
@@ -100,8 +168,33 @@ async def analyze_attention_simplified(request: SimplifiedAnalysisRequest):
             current_dt = datetime.now()
             hours_into_day = current_dt.hour + current_dt.minute / 60.0
         
+        # Track the session so upcoming interventions can be pre-generated
+        client_ip = http_request.client.host if http_request.client else "anonymous"
+        session_id = request.session_id or client_ip
+        session = user_sessions.setdefault(session_id, {})
+        session["last_seen"] = time.monotonic()
+        # Clients behind one address may share an IP-keyed session, so it gets no pre-generated messages
+        session["ip_keyed"] = request.session_id is None
+        
+        # Over-limit clients still get an answer, just without a live LLM call
+        rate_limited = rate_limiter is not None and not rate_limiter.check_request(session_id, client_ip)
+        session["ip"] = client_ip
+        session["rate_limited"] = rate_limited
+        rule_only = False
+        
+        def llm_budget() -> bool:
+            nonlocal rule_only
+            if rate_limited or not rate_limiter.consume_llm_response(session_id, client_ip):
+                rule_only = True
+            return not rule_only
+        
         # Analyze attention using the LangChain agent
-        therapeutic_response = await attention_agent.analyze_attention(request)
+        therapeutic_response = await attention_agent.analyze_attention(
+            request, session, llm_budget if rate_limiter is not None else None
+        )
+        
+        if settings.PREGENERATION_ENABLED:
+            background_tasks.add_task(pregenerator.wake)
         
         # Generate time analysis summary
         task_count = len(request.current_tasks) if isinstance(request.current_tasks, dict) else len(request.current_tasks) if isinstance(request.current_tasks, list) else 0
@@ -114,19 +207,32 @@ async def analyze_attention_simplified(request: SimplifiedAnalysisRequest):
             "time_pressure": "high" if therapeutic_response.attention_status.value == "time_pressure" else "moderate" if task_count > 3 else "low"
         }
         
-        # Calculate next check-in interval based on time pressure
-        next_check_in = 60  # default 1 minute
-        if therapeutic_response.attention_status.value == "time_pressure":
-            next_check_in = 30  # check more frequently if time pressure
-        elif therapeutic_response.attention_status.value == "focused":
-            next_check_in = 120  # check less frequently if focused
+        # Calculate next check-in interval from verdict stability, time pressure and load
+        next_check_in = next_check_in_seconds(
+            session,
+            therapeutic_response.attention_status.value,
+            therapeutic_response.action_needed,
+            in_flight_requests - 1,  # other requests besides this one
+            time.monotonic(),
+        )
         
         # Generate analysis summary
         analysis_summary = f"Time pressure: {time_analysis['time_pressure']} - Status: {therapeutic_response.attention_status.value}"
         if therapeutic_response.action_needed:
             analysis_summary += f" - Intervention provided (severity: {therapeutic_response.severity_level}/10)"
+        if rule_only:
+            analysis_summary += " - Rule-based message (rate limit or daily LLM budget reached)"
         
-        logger.info(f"Analysis complete: {analysis_summary}")
+        log_routine(
+            logger,
+            logging.INFO,
+            "Analysis complete",
+            status=therapeutic_response.attention_status.value,
+            severity=therapeutic_response.severity_level,
+            action_needed=therapeutic_response.action_needed,
+            rule_only=rule_only,
+            next_check_in=next_check_in,
+        )
         
         return AnalysisResponse(
             therapeutic_response=therapeutic_response,
@@ -137,8 +243,8 @@ async def analyze_attention_simplified(request: SimplifiedAnalysisRequest):
         )
         
     except Exception as e:
-        logger.error(f"Error analyzing attention: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
+        logger.error("Error analyzing attention", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Analysis failed: {truncate(e)}")
 
 
 @app.post("/quick-time-check")
@@ -179,8 +285,8 @@ async def quick_time_check(current_time: str, task_count: int):
         }
         
     except Exception as e:
-        logger.error(f"Error in quick time check: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Quick check failed: {str(e)}")
+        logger.error("Error in quick time check", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Quick check failed: {truncate(e)}")
 
 
 @app.get("/config")
@@ -194,11 +300,30 @@ async def get_configuration():
         "model_name": settings.MODEL_NAME,
         "temperature": settings.TEMPERATURE,
         "max_tokens": settings.MAX_TOKENS,
+        "message_max_tokens": settings.MESSAGE_MAX_TOKENS,
+        "rate_limit_enabled": settings.RATE_LIMIT_ENABLED,
+        "llm_daily_budget": settings.LLM_DAILY_BUDGET,
+        "check_in_bounds_seconds": [settings.CHECK_IN_MIN_SECONDS, settings.CHECK_IN_MAX_SECONDS],
         "version": "2.0.0",
         "features": ["time_pressure_analysis", "task_prioritization", "simplified_schema"]
     }
 
 
+@app.get("/usage")
+async def get_token_usage():
+    """
+    Get LLM token usage for therapeutic messages: totals and the most recent calls
+
+    Session keys double as client identities, so per-session usage is not exposed.
+    """
+    return {
+        "total": attention_agent.token_usage,
+        "recent_calls": list(attention_agent.recent_calls),
+        "sessions_with_usage": sum(1 for session in user_sessions.values() if "token_usage" in session),
+        "timestamp": datetime.now()
+    }
+
+
 # Legacy endpoint for backward compatibility
 @app.post("/analyze-attention")
 async def analyze_attention_legacy():
@@ -220,5 +345,6 @@ if __name__ == "__main__":
         host=settings.HOST,
         port=settings.PORT,
         reload=True,
-        log_level=settings.LOG_LEVEL.lower()
+        log_level=settings.LOG_LEVEL.lower(),
+        access_log=False  # the app logs a sampled access line itself
     ) 
\ No newline at end of file
@@ -23,6 +23,7 @@ class SimplifiedAnalysisRequest(BaseModel):
     dom: str = Field(..., description="DOM content as a string")
     current_time: str = Field(..., description="Current timestamp as ISO string")
     current_tasks: Dict[str, Any] = Field(..., description="JSON object containing current tasks")
+    session_id: Optional[str] = Field(None, description="Stable client/session identifier (defaults to the client address)")
 
 
 class TherapeuticResponse(BaseModel):
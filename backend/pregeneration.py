@@ -0,0 +1,193 @@
+"""
+Speculative pre-generation of therapeutic interventions.
+
+Time pressure is a deterministic function of wall-clock time and task load, so
+for every active session we can forecast when the pressure ratio will cross the
+medium (0.8) or high (1.2) threshold. The worker generates the intervention
+message for that crossing ahead of time, while the LLM is otherwise idle, and
+stores it on the session so the next /analyze can return it without a model wait.
+"""
+
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Mirrors the levels used by calculate_time_pressure in the attention agent
+PRESSURE_THRESHOLDS = (("medium", 0.8), ("high", 1.2))
+
+
+def forecast_crossings(session: Dict[str, Any], now: float, horizon_seconds: float) -> List[Tuple[float, Dict[str, Any]]]:
+    """Forecast the threshold crossings of a session within the horizon.
+
+    Returns (seconds_until_crossing, time_pressure_data_at_crossing) pairs.
+    """
+    data = session.get("time_pressure")
+    if not data:
+        return []
+
+    total_task_hours = data.get("total_task_hours") or 0
+    elapsed_hours = (now - session.get("observed_at", now)) / 3600
+    hours_remaining = (data.get("hours_remaining") or 0) - elapsed_hours
+    if total_task_hours <= 0 or hours_remaining <= 0:
+        return []
+
+    current_ratio = total_task_hours / hours_remaining
+    crossings = []
+    for level, threshold in PRESSURE_THRESHOLDS:
+        if current_ratio >= threshold:
+            continue  # already past it, the live path handles this level
+        hours_at_crossing = total_task_hours / threshold
+        seconds_until = (hours_remaining - hours_at_crossing) * 3600
+        if seconds_until <= horizon_seconds:
+            forecast = dict(data)
+            forecast.update({
+                "hours_remaining": round(hours_at_crossing, 2),
+                "pressure_ratio": threshold,
+                "time_pressure_level": level,
+            })
+            crossings.append((seconds_until, forecast))
+    return crossings
+
+
+def _is_fresh(entry: Dict[str, Any], total_task_hours: Optional[float], now: float) -> bool:
+    return entry["expires_at"] >= now and entry["total_task_hours"] == total_task_hours
+
+
+def take_pregenerated(session: Optional[Dict[str, Any]], key: str, total_task_hours: Optional[float]) -> Optional[str]:
+    """Pop a pre-generated message for this session, if one is still valid"""
+    if session is None:
+        return None
+    entry = session.get("pregenerated", {}).pop(key, None)
+    if entry and _is_fresh(entry, total_task_hours, time.monotonic()):
+        return entry["message"]
+    return None
+
+
+class InterventionPregenerator:
+    """Background worker that fills idle LLM capacity with upcoming interventions"""
+
+    def __init__(self, agent, sessions: Dict[str, Dict], rate_limiter=None):
+        self.agent = agent
+        self.sessions = sessions
+        self.rate_limiter = rate_limiter
+        self._live_requests = 0
+        self._last_live_at = 0.0
+        self._wake = asyncio.Event()
+        self._current: Optional[asyncio.Task] = None
+
+    @asynccontextmanager
+    async def live_request(self):
+        """Mark a live LLM call in flight; any running pre-generation is cancelled"""
+        self._live_requests += 1
+        if self._current is not None and not self._current.done():
+            self._current.cancel()
+        try:
+            yield
+        finally:
+            self._live_requests -= 1
+            self._last_live_at = time.monotonic()
+
+    def wake(self):
+        """Ask the worker to re-forecast now instead of waiting for the next tick"""
+        self._wake.set()
+
+    def _is_idle(self) -> bool:
+        return (
+            self._live_requests == 0
+            and time.monotonic() - self._last_live_at >= settings.PREGENERATION_IDLE_GRACE_SECONDS
+        )
+
+    async def run(self):
+        """Worker loop, started as a task on application startup"""
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=settings.PREGENERATION_INTERVAL_SECONDS)
+                # Woken by a live request: give follow-up traffic a moment first
+                await asyncio.sleep(settings.PREGENERATION_IDLE_GRACE_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+            try:
+                await self._pregenerate_pending()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Pre-generation pass failed: %s", type(e).__name__)
+
+    def _pending(self, now: float) -> List[Tuple[float, str, str, str, Dict[str, Any]]]:
+        """Collect (eta, session_id, key, context, forecast) for messages not yet generated
+
+        Sessions keyed only by client address are skipped: users behind one
+        address would otherwise receive messages built from each other's state.
+        Rate-limited sessions are skipped as well, and so are sessions that have
+        been quiet for longer than PREGENERATION_ACTIVE_SECONDS, since they are
+        unlikely to come back for the message.
+        """
+        pending = []
+        for session_id, session in list(self.sessions.items()):
+            if session.get("ip_keyed") or session.get("rate_limited"):
+                continue
+            if now - session.get("last_seen", now) > settings.PREGENERATION_ACTIVE_SECONDS:
+                continue
+
+            stored = session.setdefault("pregenerated", {})
+            for eta, forecast in forecast_crossings(session, now, settings.PREGENERATION_HORIZON_SECONDS):
+                built = self.agent.build_message_context(session.get("dom_analysis"), forecast)
+                if built is None:
+                    continue
+                key, context = built
+                entry = stored.get(key)
+                if entry and _is_fresh(entry, forecast.get("total_task_hours"), now):
+                    continue
+                pending.append((eta, session_id, key, context, forecast))
+
+        pending.sort(key=lambda item: item[0])
+        return pending
+
+    async def _pregenerate_pending(self):
+        for eta, session_id, key, context, forecast in self._pending(time.monotonic()):
+            if not self._is_idle():
+                return
+            session = self.sessions.get(session_id)
+            if session is None:
+                continue
+            # Pre-generated messages are LLM calls too, so they count against the daily budgets
+            if self.rate_limiter is not None and not self.rate_limiter.llm_budget_available(session_id, session.get("ip")):
+                continue
+
+            task = asyncio.create_task(self.agent.agenerate_therapeutic_message(key, context, session))
+            self._current = task
+            try:
+                await asyncio.wait({task})
+            except asyncio.CancelledError:
+                task.cancel()
+                raise
+            finally:
+                self._current = None
+
+            if task.cancelled():
+                logger.debug("Pre-generation yielded to live traffic")
+                return
+            if task.exception() is not None:
+                logger.warning("Pre-generation failed: %s", type(task.exception()).__name__)
+                continue
+
+            # Charge only completed messages, so attempts cancelled by live traffic cost nothing
+            if self.rate_limiter is not None and not self.rate_limiter.consume_llm_response(session_id, session.get("ip")):
+                continue
+            session = self.sessions.get(session_id)
+            if session is None:
+                continue
+            session.setdefault("pregenerated", {})[key] = {
+                "message": task.result(),
+                "total_task_hours": forecast.get("total_task_hours"),
+                "expires_at": time.monotonic() + max(eta, 0) + settings.PREGENERATION_TTL_SECONDS,
+            }
+            logger.info("Pre-generated '%s' intervention %.0fs ahead of crossing", key, eta)
@@ -0,0 +1,166 @@
+"""
+Per-client rate limiting and daily LLM budgets.
+
+State lives in a local SQLite file so every worker process on the host shares
+the same buckets. Each check is a single UPSERT on the key's primary-key index
+(a B-tree, so O(log n) in the number of tracked keys); rows that no longer
+carry state are pruned periodically to keep that index small.
+
+The checks run on the event loop, so SQLite is only allowed to wait briefly
+for another worker's write lock. If it cannot get the lock in time the limiter
+fails open and lets the request through.
+"""
+
+import logging
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _today() -> str:
+    return time.strftime("%Y-%m-%d", time.gmtime())
+
+
+class RateLimiter:
+    """Token buckets per key plus per-client and per-IP daily budgets of LLM-backed responses"""
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._last_prune = time.monotonic()
+        self._db = sqlite3.connect(
+            path,
+            timeout=settings.RATE_LIMIT_DB_TIMEOUT_MS / 1000,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS buckets ("
+            "key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL, full_at REAL NOT NULL"
+            ") WITHOUT ROWID"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS llm_budgets (key TEXT PRIMARY KEY, day TEXT NOT NULL, used INTEGER NOT NULL) WITHOUT ROWID"
+        )
+
+    def _execute(self, sql: str, params: dict) -> Optional[int]:
+        """Run one statement and return the number of rows it changed, or None if the store was busy"""
+        try:
+            with self._lock:
+                return self._db.execute(sql, params).rowcount
+        except sqlite3.OperationalError as e:
+            logger.warning("Rate limiter store unavailable, allowing request: %s", e)
+            return None
+
+    def allow(self, key: str, capacity: float, refill_per_second: float) -> bool:
+        """Take one token from the bucket for key; False when the bucket is empty"""
+        # Refill and take a token in one statement; the WHERE clause leaves an
+        # empty bucket untouched, so rowcount tells us whether we got a token.
+        # full_at records when the bucket will be full again, for pruning.
+        changed = self._execute(
+            """
+            INSERT INTO buckets (key, tokens, updated, full_at)
+            VALUES (:key, :capacity - 1, :now, :now + 1 / :rate)
+            ON CONFLICT(key) DO UPDATE SET
+                tokens = MIN(:capacity, tokens + (:now - updated) * :rate) - 1,
+                updated = :now,
+                full_at = :now + (:capacity - MIN(:capacity, tokens + (:now - updated) * :rate) + 1) / :rate
+            WHERE MIN(:capacity, tokens + (:now - updated) * :rate) >= 1
+            """,
+            {"key": key, "capacity": capacity, "rate": refill_per_second, "now": time.time()},
+        )
+        return changed != 0
+
+    def _refund(self, key: str, capacity: float, refill_per_second: float):
+        """Give back a token taken by allow() when a later check refuses the request"""
+        self._execute(
+            """
+            UPDATE buckets SET
+                tokens = MIN(:capacity, tokens + 1),
+                full_at = MAX(updated, full_at - 1 / :rate)
+            WHERE key = :key
+            """,
+            {"key": key, "capacity": capacity, "rate": refill_per_second},
+        )
+
+    def consume_llm_budget(self, budget_key: str, daily_limit: int) -> bool:
+        """Count one LLM-backed response against today's budget; False when it is spent"""
+        changed = self._execute(
+            """
+            INSERT INTO llm_budgets (key, day, used) VALUES (:key, :day, 1)
+            ON CONFLICT(key) DO UPDATE SET
+                used = CASE WHEN day = :day THEN used + 1 ELSE 1 END,
+                day = :day
+            WHERE day != :day OR used < :limit
+            """,
+            {"key": budget_key, "day": _today(), "limit": daily_limit},
+        )
+        return changed != 0
+
+    def _refund_llm_budget(self, budget_key: str):
+        self._execute(
+            "UPDATE llm_budgets SET used = used - 1 WHERE key = :key AND day = :day AND used > 0",
+            {"key": budget_key, "day": _today()},
+        )
+
+    def llm_budget_available(self, client_id: str, ip: str) -> bool:
+        """Whether the client and the IP both have LLM budget left today, without charging it"""
+        limits = {f"client:{client_id}": settings.LLM_DAILY_BUDGET, f"ip:{ip}": settings.LLM_DAILY_BUDGET_PER_IP}
+        try:
+            with self._lock:
+                rows = self._db.execute(
+                    "SELECT key, used FROM llm_budgets WHERE key IN (:client, :ip) AND day = :day",
+                    {"client": f"client:{client_id}", "ip": f"ip:{ip}", "day": _today()},
+                ).fetchall()
+        except sqlite3.OperationalError as e:
+            logger.warning("Rate limiter store unavailable, allowing request: %s", e)
+            return True
+        return all(used < limits[key] for key, used in rows)
+
+    def consume_llm_response(self, client_id: str, ip: str) -> bool:
+        """Charge one LLM-backed response to the client's and the IP's daily budgets
+
+        The client is charged first and the IP only if that succeeds, so one
+        client that has spent its budget cannot use up the budget shared by
+        everyone behind its address. The IP budget bounds callers that rotate
+        their client id to get fresh budgets.
+        """
+        client_key = f"client:{client_id}"
+        if not self.consume_llm_budget(client_key, settings.LLM_DAILY_BUDGET):
+            return False
+        if not self.consume_llm_budget(f"ip:{ip}", settings.LLM_DAILY_BUDGET_PER_IP):
+            self._refund_llm_budget(client_key)
+            return False
+        return True
+
+    def check_request(self, client_id: str, ip: str) -> bool:
+        """Apply the per-client and per-IP buckets to one /analyze request
+
+        Like the budgets, the client bucket is checked first and the IP bucket
+        only charged once the client passes, so a looping client drains only its own bucket.
+        """
+        self._maybe_prune()
+        client_bucket = (f"client:{client_id}", settings.RATE_LIMIT_CLIENT_CAPACITY, settings.RATE_LIMIT_CLIENT_PER_MINUTE / 60)
+        if not self.allow(*client_bucket):
+            return False
+        if not self.allow(f"ip:{ip}", settings.RATE_LIMIT_IP_CAPACITY, settings.RATE_LIMIT_IP_PER_MINUTE / 60):
+            self._refund(*client_bucket)
+            return False
+        return True
+
+    def _maybe_prune(self):
+        """Delete full buckets and budgets from past days, at most once per prune interval"""
+        now = time.monotonic()
+        if now - self._last_prune < settings.RATE_LIMIT_PRUNE_INTERVAL_SECONDS:
+            return
+        self._last_prune = now
+        # A missing bucket is created full and a missing budget starts at zero,
+        # so deleting these rows does not change any limit.
+        self._execute("DELETE FROM buckets WHERE full_at <= :now", {"now": time.time()})
+        self._execute("DELETE FROM llm_budgets WHERE day != :day", {"day": _today()})
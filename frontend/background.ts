@@ -173,6 +173,29 @@ let currentTabData: EnhancedTabData | null = null
 let lastResponseTime = 0
 let domMonitoringCleanup: (() => void) | null = null
 let lastAnalysisTime = 0 // Track last backend analysis to prevent spam
+let nextAnalysisDelayMs = 30000 // Updated from the backend's next_check_in_seconds
+let lastAnalyzedHost: string | null = null // Site of the last backend analysis
+// Pre-adaptive limit, used instead of the backend interval once the user moves to another site
+const SITE_CHANGE_ANALYSIS_DELAY_MS = 30000
+
+function getHostname(url: string): string {
+  try {
+    return new URL(url).hostname
+  } catch {
+    return url
+  }
+}
+
+// Stable per-install id so the backend can track this client across requests
+async function getSessionId(): Promise<string> {
+  const { sessionId } = await chrome.storage.local.get("sessionId")
+  if (sessionId) {
+    return sessionId
+  }
+  const newSessionId = crypto.randomUUID()
+  await chrome.storage.local.set({ sessionId: newSessionId })
+  return newSessionId
+}
 
 // Backend API integration function
 async function analyzeTabWithBackend(
@@ -185,7 +208,8 @@ async function analyzeTabWithBackend(
     const requestPayload = {
       dom: snapshot.dom_string,
       current_time: snapshot.timestamp,
-      current_tasks: snapshot.current_tasks
+      current_tasks: snapshot.current_tasks,
+      session_id: await getSessionId()
     }
 
     console.log("📤 Backend request payload:", {
@@ -263,13 +287,24 @@ function initializeDOMMonitoring() {
           lastExtractionTime: new Date().toISOString()
         })
 
-        // Rate limiting: only analyze every 30 seconds to prevent spam
+        // Rate limiting: while the user stays on the same site, only analyze as
+        // often as the backend asks us to check in; a site change (e.g. from
+        // work to a distracting page) waits at most the old 30 seconds
         const currentTime = Date.now()
-        if (currentTime - lastAnalysisTime > 30000) {
+        const host = getHostname(domData.url)
+        const requiredDelayMs =
+          host === lastAnalyzedHost
+            ? nextAnalysisDelayMs
+            : Math.min(nextAnalysisDelayMs, SITE_CHANGE_ANALYSIS_DELAY_MS)
+        if (currentTime - lastAnalysisTime > requiredDelayMs) {
           lastAnalysisTime = currentTime
+          lastAnalyzedHost = host
 
           // Send to backend for analysis
           const analysisResult = await analyzeTabWithBackend(snapshot)
+          if (analysisResult) {
+            nextAnalysisDelayMs = analysisResult.next_check_in_seconds * 1000
+          }
 
           if (
             analysisResult &&